@@ -33,28 +33,63 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License."""
 
+import cProfile
+import heapq
+import hmac
+import errno
+import json
+import multiprocessing
 import os
 import os.path
+import posixpath
+import pickle
+import pstats
+import queue
+import stat as st
+import struct
 import tarfile
+import tempfile
+import threading
+import time
+import tracemalloc
 import typing as t
-from urllib.parse import urlparse
+import urllib.error
+import urllib.request
+import weakref
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from urllib.parse import quote, urlparse
 import uu
 import re
 import mimetypes
 from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 from enum import IntEnum
 from functools import lru_cache, partial, wraps
-from io import BytesIO
-from os import PathLike, listdir
+from html import escape
+from itertools import islice
+from operator import attrgetter, itemgetter
+from io import BytesIO, FileIO, StringIO
+from os import PathLike
 from os.path import abspath, basename, expanduser, isfile, realpath, relpath
 from hashlib import sha256
-from subprocess import check_output
+from subprocess import CalledProcessError, check_output
 from textwrap import dedent
 
 import flask as fl
 from jinja2 import Template
+from werkzeug.http import http_date, is_resource_modified
+from werkzeug.wsgi import wrap_file
+
+try:
+  from PIL import Image
+except ImportError: # thumbnails are optional
+  Image = None
 
 
 ##==============================================================================
@@ -66,8 +101,9 @@ from jinja2 import Template
 #? frontend base class
 #? basic frontends
 #? pluggable backend
+#? tar, zip and s3 backends
 #@ password secured views (cookie auth)
-#@ nginx frontend
+#? nginx frontend
 #@ custom css for apache frontend
 
 ##==============================================================================
@@ -189,14 +225,25 @@ def mimetype(path:PathLike) -> str:
         .decode("utf8")\
         .strip()
 
+def _multi_mimetype(paths:t.Sequence[PathLike],
+                    argmax:int=1<<17) -> t.List[str]:
+  # split the arguments, so huge directories don't hit the ARG_MAX limit
+  mimes, batch, size = [], [], 0
+  for path in (*paths, None):
+    if batch and (path is None or size + len(path) > argmax):
+      mimes += check_output(["file", "-rb", "--mime-type", *batch])\
+              .decode("utf8")\
+              .strip()\
+              .splitlines()
+      batch, size = [], 0
+    if path is not None:
+      batch.append(path)
+      size += len(path) + 1
+  return mimes
+
 @timed_lru_cache(minutes=30, maxsize=64)
 def multi_mimetype(paths:t.Tuple[PathLike]) -> t.List[str]:
-  if not paths:
-    return []
-  return check_output(["file", "-rb", "--mime-type", *paths])\
-        .decode("utf8")\
-        .strip()\
-        .splitlines()
+  return _multi_mimetype(paths)
 
 def sizeof_fmt(num, suffix="B"):
   if num == 0:
@@ -213,7 +260,7 @@ def is_subdir(path, directory):
   directory = realpath(directory)
   rel = relpath(path, directory)
 
-  return rel.startswith(os.pardir) or (path == directory)
+  return rel != os.pardir and not rel.startswith(os.pardir + os.sep)
 
 def abstractmember(*args):
   def outer(func):
@@ -227,37 +274,436 @@ def abstractmember(*args):
     return inner
   return outer
 
-#https://blog.asgaard.co.uk/2012/08/03/http-206-partial-content-for-flask-python
-def send_file_partial(path):
-  range_header = fl.request.headers.get("Range", None)
-  if not range_header: return fl.send_file(path)
+@dataclass(frozen=True)
+class FileMeta(object):
+  __slots__ = ("size", "mtime", "mime", "etag")
 
-  size = os.path.getsize(path)
-  byte1, byte2 = 0, None
+  size: int
+  mtime: datetime
+  mime: str
+  etag: str
+
+@lru_cache(maxsize=1024)
+def _file_meta(path:PathLike, ino:int, size:int, mtime_ns:int) -> FileMeta:
+  # `ino`, `size` and `mtime_ns` are only there to invalidate the cache,
+  # so the mime is sniffed uncached (`mimetype` is keyed on the path alone)
+  mtime = datetime.fromtimestamp(mtime_ns // 10**9, timezone.utc)
+  return FileMeta(size, mtime, _multi_mimetype([path])[0],
+                  f"{ino:x}-{mtime_ns:x}-{size:x}")
+
+def file_meta(path:PathLike, fd:int=None) -> FileMeta:
+  """size, mime and etag of a file, costs a single stat when cached"""
+  stat = os.stat(path) if fd is None else os.fstat(fd)
+  return _file_meta(path, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+def reopen(fd:int, flags:int=os.O_RDONLY) -> int:
+  """turn a `O_PATH` descriptor into a usable one, without a new lookup"""
+  if O_PATH == os.O_RDONLY:
+    return os.dup(fd)
+  return os.open(f"/proc/self/fd/{fd}", flags | os.O_CLOEXEC)
+
+def read_range(path:PathLike, offset:int, length:int, readahead:int=0,
+               chunksize:int=1<<16, fd:int=None) -> t.Iterator[bytes]:
+  fd = os.open(path, os.O_RDONLY) if fd is None else reopen(fd)
+  try:
+    if readahead and hasattr(os, "posix_fadvise"):
+      # hint the kernel that the player is going to play from here on
+      os.posix_fadvise(fd, offset, length, os.POSIX_FADV_SEQUENTIAL)
+      os.posix_fadvise(fd, offset, min(length, readahead),
+                       os.POSIX_FADV_WILLNEED)
+    while length > 0:
+      chunk = os.pread(fd, min(chunksize, length), offset)
+      if not chunk:
+        break
+      offset += len(chunk)
+      length -= len(chunk)
+      yield chunk
+  finally:
+    os.close(fd)
+
+class ClosingFile(FileIO):
+  """
+  A file that closes the `Response` it's the body of. A `wsgi.file_wrapper`
+  body has to be passed through as is, which skips `Response.close` (and
+  with it `call_on_close`), so the server closing the file does it instead.
+  """
+  response = None
+
+  def close(self) -> None:
+    response, self.response = self.response, None
+    super().close()
+    if response is not None:
+      response.close()
+
+O_PATH = getattr(os, "O_PATH", os.O_RDONLY)
+MAXSYMLINKS = 40
+
+class ResolveError(Exception):
+  def __init__(self, message:str, status:int):
+    super().__init__(message)
+    self.status = status
 
-  m = re.search(r"(\d+)-(\d*)", range_header)
-  g = m.groups()
 
-  if g[0]: byte1 = int(g[0])
-  if g[1]: byte2 = int(g[1])
+@dataclass(init=False)
+class Resolved(object):
+  """
+  An open file or directory under a `DirView` root. `fd` is an `O_PATH`
+  descriptor for files and a readable one for directories.
+  """
+  __slots__ = ("path", "fd", "stat")
+
+  path: str
+  fd: int
+  stat: os.stat_result
+
+  def __init__(self, path:str, fd:int, stat:os.stat_result):
+    self.path = path
+    self.fd = fd
+    self.stat = stat
 
-  length = size - byte1
-  if byte2 is not None:
-      length = byte2 - byte1
+  @property
+  def isdir(self) -> bool:
+    return st.S_ISDIR(self.stat.st_mode)
+
+  def close(self) -> None:
+    if self.fd is not None:
+      os.close(self.fd)
+      self.fd = None
+
+
+def resolve(root:str, rootfd:int, path:str) -> Resolved:
+  """
+  Walk `path` from the directory `rootfd` (whose realpath is `root`) one
+  component at a time with `openat`, following symlinks by hand, so the
+  result can never end up outside of the root, whatever gets renamed meanwhile.
+  """
+  parts = [x for x in reversed(path.split("/")) if x not in ("", ".")]
+  chain: t.List[t.Tuple[str, int]] = [] # (name, fd) of everything below root
+  links = 0
+  try:
+    while parts:
+      name = parts.pop()
+      if name == "..":
+        if not chain:
+          raise ResolveError("Path out of bounds", 403)
+        os.close(chain.pop()[1])
+        continue
+
+      parent = chain[-1][1] if chain else rootfd
+      try:
+        # without `O_PATH` a fifo would block `open` before it's checked
+        fd = os.open(name, O_PATH | os.O_NOFOLLOW | os.O_NONBLOCK |
+                     os.O_CLOEXEC, dir_fd=parent)
+        islink = st.S_ISLNK(os.fstat(fd).st_mode)
+        if islink:
+          os.close(fd)
+      except PermissionError:
+        raise ResolveError("Permission denied", 403) from None
+      except OSError as err:
+        if err.errno != errno.ELOOP: # no `O_PATH`, so `O_NOFOLLOW` refused
+          raise ResolveError("Path doesn't exist", 404) from None
+        islink = True
+
+      if not islink:
+        chain.append((name, fd))
+        continue
+
+      links += 1
+      if links > MAXSYMLINKS:
+        raise ResolveError("Path doesn't exist", 404)
+      target = os.readlink(name, dir_fd=parent)
+      if target.startswith("/"):
+        if target != root and not target.startswith(root.rstrip("/") + "/"):
+          raise ResolveError("Path out of bounds", 403)
+        target = target[len(root):]
+        while chain:
+          os.close(chain.pop()[1])
+      parts.extend(x for x in reversed(target.split("/")) if x not in ("", "."))
+
+    fd = chain[-1][1] if chain else rootfd
+    stat = os.fstat(fd)
+    real = os.path.join(root, *(x for x, _ in chain))
+    if st.S_ISDIR(stat.st_mode):
+      fd = os.open(".", os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC, dir_fd=fd)
+    elif not st.S_ISREG(stat.st_mode):
+      raise ResolveError("Path doesn't exist", 404)
+    else:
+      name, _ = chain.pop()
+      if not os.access(name, os.R_OK, dir_fd=chain[-1][1] if chain else rootfd):
+        os.close(fd)
+        raise ResolveError("Permission denied", 403)
+    return Resolved(real, fd, stat)
+  except PermissionError:
+    raise ResolveError("Permission denied", 403) from None
+  finally:
+    for _, fd in chain:
+      os.close(fd)
 
-  data = None
-  with open(path, "rb") as f:
-      f.seek(byte1)
-      data = f.read(length)
+#https://blog.asgaard.co.uk/2012/08/03/http-206-partial-content-for-flask-python
+def send_file_partial(path:PathLike, max_age:int=3600, readahead:int=0,
+                      fd:int=None):
+  reader = partial(read_range, path, readahead=readahead, fd=fd)
+  opener = lambda: ClosingFile(path if fd is None else reopen(fd))
+  return send_range(file_meta(path, fd), reader, max_age, opener)
+
+def send_range(meta:FileMeta, reader:t.Callable[[int, int], t.Iterable[bytes]],
+               max_age:int=3600, opener:t.Callable[[], ClosingFile]=None):
+  """
+  Answer a (range) request for a file described by `meta`, whose content is
+  produced by `reader(offset, length)`. A whole file is rather sent from
+  `opener()`, through `wsgi.file_wrapper` (sendfile), when it's given.
+  """
+  headers = {
+    "Accept-Ranges": "bytes",
+    "Cache-Control": f"public, max-age={max_age}",
+    "ETag": f'"{meta.etag}"',
+    "Last-Modified": http_date(meta.mtime)}
+
+  req = fl.request
+  if not is_resource_modified(req.environ, meta.etag, None, meta.mtime):
+    return fl.Response(status=304, headers=headers)
+
+  status, start, stop = 200, 0, meta.size
+  rng = req.range
+  if_range = req.if_range
+  if (if_range.etag or meta.etag) != meta.etag \
+  or (if_range.date or meta.mtime) != meta.mtime:
+    rng = None # the client's copy is outdated, send the whole file instead
+  if rng is not None and rng.units == "bytes" and len(rng.ranges) == 1:
+    span = rng.range_for_length(meta.size)
+    if span is None:
+      headers["Content-Range"] = f"bytes */{meta.size}"
+      return fl.Response(status=416, headers=headers)
+    status, (start, stop) = 206, span
+    headers["Content-Range"] = f"bytes {start}-{stop - 1}/{meta.size}"
+
+  # HEAD is answered from the cached metadata without opening the file
+  if req.method == "HEAD":
+    rv = fl.Response((), status, headers, mimetype=meta.mime)
+  elif status == 200 and opener is not None:
+    file = opener()
+    rv = fl.Response(wrap_file(req.environ, file), status, headers,
+                     mimetype=meta.mime, direct_passthrough=True)
+    file.response = rv
+  else:
+    rv = fl.Response(reader(start, stop - start), status, headers,
+                     mimetype=meta.mime)
+  rv.headers.set("Content-Length", str(stop - start))
+  return rv
 
-  rv = fl.Response(data,
-      206,
-      mimetype=mimetype(path),
-      direct_passthrough=True)
-  rv.headers.add("Content-Range", "bytes {0}-{1}/{2}".format(
-                    byte1, byte1 + length - 1, size))
+##==============================================================================
+##                                 profiling                                  ##
+
+_tracing = threading.local()
+
+class Trace(object):
+  """
+  Timings of a single request. Phases are exclusive, time spent in a phase
+  nested in another one (e.g. mime in scan) is only counted once.
+  """
+  __slots__ = ("path", "method", "started", "start", "phases", "counts",
+               "status", "total", "profile", "memory", "owner", "capture",
+               "_stack")
+
+  def __init__(self, path:str, method:str):
+    self.path = path
+    self.method = method
+    self.started = datetime.now(timezone.utc)
+    self.start = time.perf_counter()
+    self.phases: t.Dict[str, float] = {}
+    self.counts: t.Dict[str, int] = {}
+    self.status = self.total = None
+    self.profile: t.Optional[str] = None
+    self.memory: t.Optional[dict] = None
+    self.owner: t.Optional["Profiler"] = None
+    self.capture: t.Optional[cProfile.Profile] = None # while it's running
+    self._stack: t.List[list] = [] # [name, start, time of nested phases]
+
+  def __lt__(self, other:"Trace") -> bool: # slowest requests are a heap
+    return self.total < other.total
+
+  def enter(self, name:str) -> None:
+    self._stack.append([name, time.perf_counter(), 0.0])
+
+  def exit(self) -> None:
+    name, start, nested = self._stack.pop()
+    elapsed = time.perf_counter() - start
+    self.phases[name] = self.phases.get(name, 0.0) + elapsed - nested
+    if self._stack:
+      self._stack[-1][2] += elapsed
+
+  def to_dict(self) -> dict:
+    ms = lambda x: round(x * 1000, 3)
+    return {"path": self.path, "method": self.method, "status": self.status,
+            "started": self.started.isoformat(), "total_ms": ms(self.total),
+            "phases_ms": {k: ms(v) for k, v in self.phases.items()},
+            "counts": self.counts, "memory": self.memory,
+            "profile": self.profile}
+
+
+@contextmanager
+def phase(name:str) -> t.Iterator[None]:
+  """time the block as `name` in the trace of the current request, if any"""
+  trace = getattr(_tracing, "trace", None)
+  if trace is None:
+    yield
+    return
+  trace.enter(name)
+  try:
+    yield
+  finally:
+    trace.exit()
+
+
+def tally(name:str, n:int) -> None:
+  """add `n` to the counter `name` of the current request, if it's traced"""
+  trace = getattr(_tracing, "trace", None)
+  if trace is not None:
+    trace.counts[name] = trace.counts.get(name, 0) + n
+
+
+def timed(name:str, iterable:t.Iterable) -> t.Iterator:
+  # only `next` is timed, so a generator abandoned mid-page can't leave
+  # a phase open
+  it = iter(iterable)
+  while True:
+    with phase(name):
+      try:
+        piece = next(it)
+      except StopIteration:
+        return
+    yield piece
+
+
+class Profiler(object):
+  """
+  Opt-in request profiler of a `DirView`. Every request is split into
+  phases (resolve, scan, mime, sort, render, send) and the `slowest` ones
+  are kept, viewable at `/<uid>/debug?token=<token>`.
+  A request with a `X-Dirview-Profile: <token>` header, and the next request
+  to a path that took more than `threshold` seconds, also run under cProfile
+  and tracemalloc; the last `slowest` of those are kept as well.
+  `teardown` has to be registered as a `teardown_request` hook of the app.
+  """
+  header = "X-Dirview-Profile"
+
+  def __init__(self, token:str, slowest:int=20, threshold:float=1.0,
+                     top:int=30):
+    self.token = token
+    self.slowest = slowest
+    self.threshold = threshold
+    self.top = top # functions and allocation sites shown per profile
+    self._slowest: t.List[Trace] = []
+    self._profiled: "deque[Trace]" = deque(maxlen=slowest)
+    self._armed: "OrderedDict[str, None]" = OrderedDict() # the last `slowest`
+    self._lock = threading.Lock()
+    self._capture = threading.Lock() # both profilers are per process
+    self._tracemalloc = False # whether the running capture started it
+
+  def authorized(self, token:t.Optional[str]) -> bool:
+    return token is not None and \
+           hmac.compare_digest(token.encode("utf8"), self.token.encode("utf8"))
+
+  def trace(self, view:t.Callable, *args) -> fl.Response:
+    """run `view(*args)`, the trace ends once the response is closed"""
+    trace = Trace(fl.request.path, fl.request.method)
+    trace.owner = self
+    wanted = self.authorized(fl.request.headers.get(self.header)) or \
+             trace.path in self._armed
+    if wanted and self._capture.acquire(blocking=False):
+      profile = cProfile.Profile()
+      try:
+        profile.enable()
+      except ValueError: # another profiler is already active
+        self._capture.release()
+      else:
+        trace.capture = profile
+        with self._lock:
+          self._armed.pop(trace.path, None)
+        self._tracemalloc = not tracemalloc.is_tracing()
+        if self._tracemalloc: # left alone when someone else started it
+          tracemalloc.start()
+
+    _tracing.trace = trace
+    try:
+      resp = fl.make_response(view(*args))
+    except BaseException:
+      self._finish(trace, 500)
+      raise
+    trace.enter("send")
+    resp.call_on_close(partial(self._finish, trace, resp.status_code))
+    # an `after_request` handler may swap the response for another one,
+    # then this one is never closed, only collected
+    weakref.finalize(resp, self._finish, trace, resp.status_code)
+    return resp
+
+  def teardown(self, exc:BaseException=None) -> None:
+    """
+    Finish the trace (and release the capture) of a request that failed
+    after its view returned, e.g. in an `after_request` handler. Flask
+    throws such a response away without closing it. A client hanging up on
+    a streamed response isn't a failure, closing the response finishes it.
+    """
+    trace = getattr(_tracing, "trace", None)
+    if isinstance(exc, GeneratorExit):
+      return
+    if exc is not None and trace is not None and trace.owner is self:
+      self._finish(trace, 500)
+
+  def report(self) -> dict:
+    with self._lock:
+      slowest = sorted(self._slowest, reverse=True)
+      profiled = list(reversed(self._profiled))
+      armed = sorted(self._armed)
+    return {"slowest": [x.to_dict() for x in slowest],
+            "profiled": [x.to_dict() for x in profiled], "armed": armed}
+
+  def _stop(self, trace:Trace) -> None:
+    profile, trace.capture = trace.capture, None
+    if profile is None: # not captured, or stopped already
+      return
+    try:
+      profile.disable()
+      snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() \
+                 else None
+      current, peak = tracemalloc.get_traced_memory()
+    finally:
+      if self._tracemalloc:
+        tracemalloc.stop()
+      self._capture.release()
+
+    out = StringIO()
+    stats = pstats.Stats(profile, stream=out)
+    stats.sort_stats("cumulative").print_stats(self.top)
+    trace.profile = out.getvalue()
+    trace.memory = {"current": current, "peak": peak, "top": [
+      str(x) for x in snapshot.statistics("lineno")[:self.top]]} \
+      if snapshot is not None else None
+
+  def _finish(self, trace:Trace, status:int) -> None:
+    if trace.total is not None: # closed after a teardown that finished it
+      return
+    self._stop(trace)
+    while trace._stack: # "send", or whatever an error didn't get to close
+      trace.exit()
+    trace.total = time.perf_counter() - trace.start
+    trace.status = status
+    if getattr(_tracing, "trace", None) is trace:
+      _tracing.trace = None
+
+    with self._lock:
+      if trace.profile is not None:
+        self._profiled.append(trace)
+      elif trace.total >= self.threshold:
+        self._armed[trace.path] = None
+        self._armed.move_to_end(trace.path)
+        if len(self._armed) > self.slowest:
+          self._armed.popitem(last=False)
+      if len(self._slowest) < self.slowest:
+        heapq.heappush(self._slowest, trace)
+      elif self._slowest and self._slowest[0] < trace:
+        heapq.heapreplace(self._slowest, trace)
 
-  return rv
 
 ##==============================================================================
 ##                               base classes                                 ##
@@ -284,11 +730,12 @@ class ListingItem(object):
   size: int
   sizefmt: str
 
-  def __init__(self, path:PathLike, initmime=True):
+  def __init__(self, path:PathLike, initmime=True, stat:os.stat_result=None):
     super().__init__()
     self.path = os.path.abspath(path)
-    stat = os.stat(self.path) #better then calling it 3 times via other method
-    self.isdir = os.path.isdir(self.path)
+    if stat is None:
+      stat = os.stat(self.path) #better then calling it 3 times via other method
+    self.isdir = st.S_ISDIR(stat.st_mode)
     self.basename = os.path.basename(self.path)
     self.name = self.basename
     self.size = stat.st_size
@@ -305,21 +752,297 @@ class ListingItem(object):
     self.lastmod = datetime.fromtimestamp(stat.st_mtime)
     self.lastmodfmt = self.lastmod.strftime(r"%Y-%m-%d %H:%M")
 
+  @classmethod
+  def from_entry(cls, path:str, entry:"Entry", mime:str) -> "ListingItem":
+    """an item of a `Backend` listing, `path` is relative to the backend root"""
+    self = cls.__new__(cls)
+    self.path = path
+    self.basename = entry.name
+    self.isdir = entry.isdir
+    self.name = entry.name + "/" if entry.isdir else entry.name
+    self.size = 0 if entry.isdir else entry.size
+    self.sizefmt = "-" if entry.isdir else sizeof_fmt(entry.size)
+    self.mime = mime
+    self.lastmod = datetime.fromtimestamp(entry.mtime)
+    self.lastmodfmt = self.lastmod.strftime(r"%Y-%m-%d %H:%M")
+    return self
+
+  def to_row(self) -> tuple:
+    return tuple(getattr(self, name) for name in self.__slots__)
+
+  @classmethod
+  def from_row(cls, row:tuple) -> "ListingItem":
+    self = cls.__new__(cls)
+    for name, value in zip(cls.__slots__, row):
+      setattr(self, name, value)
+    return self
+
+
+class Descending(object):
+  """wraps a value so it sorts the other way around"""
+  __slots__ = ("value",)
+
+  def __init__(self, value):
+    self.value = value
+
+  def __eq__(self, other:"Descending") -> bool:
+    return self.value == other.value
+
+  def __lt__(self, other:"Descending") -> bool:
+    return other.value < self.value
+
+
+def sort_key(key:SRT, asc:bool=True, row:bool=False) -> t.Callable:
+  """
+  `key`, then the mime and name presort as tie breakers, since runs on disk
+  can't rely on a stable sort. Only `key` is reversed by `asc=False`, ties
+  stay ascending, like the stable `reverse` sort of an in-memory listing.
+  With `row=True` it works on `to_row` tuples.
+  """
+  attrs = (["lastmod", "name", "size", "mime"][key], "mime", "name")
+  get = itemgetter(*map(ListingItem.__slots__.index, attrs)) if row \
+        else attrgetter(*attrs)
+  if asc:
+    return get
+  def reverse_key(x):
+    first, *rest = get(x)
+    return (Descending(first), *rest)
+  return reverse_key
+
+
+class MemoryBudget(object):
+  """a byte counter shared by everything that keeps listings in memory"""
+  def __init__(self, limit:int):
+    self.limit = limit
+    self.used = 0
+    self._lock = threading.Lock()
+
+  def acquire(self, nbytes:int, force:bool=False) -> bool:
+    with self._lock:
+      if self.used + nbytes > self.limit and not force:
+        return False
+      self.used += nbytes
+      return True
+
+  def acquire_upto(self, nbytes:int, least:int=0) -> int:
+    """acquire as much of `nbytes` as is left, but no less than `least`"""
+    with self._lock:
+      nbytes = max(min(nbytes, self.limit - self.used), least)
+      self.used += nbytes
+      return nbytes
+
+  def release(self, nbytes:int) -> None:
+    with self._lock:
+      self.used -= nbytes
+
+
+class SpilledListing(object):
+  """
+  A listing too big for the memory budget, kept on disk as unsorted chunks.
+  `sorted` sorts every chunk into runs (once per ordering) and lazily merges
+  the runs. A run is charged to `budget` while it's sorted, and is made
+  smaller to fit in it. Runs are merged `fanin` at a time, in as many passes
+  as needed, with read buffers charged to `budget` too; so only a run, or
+  a few frames per merged run, is ever held in memory.
+  """
+  batch = 64 # rows per pickle frame, the smallest piece read back
+  fanin = 16 # runs (and open files) per merge
+
+  def __init__(self, budget:"MemoryBudget"=None):
+    self.count = 0
+    self.budget = budget
+    self._dir = tempfile.TemporaryDirectory(prefix="flask_dirview-")
+    self._chunks: t.List[t.Tuple[str, int]] = []
+    self._runs: t.Dict[t.Tuple[SRT, bool], t.List[str]] = {}
+    self._lock = threading.Lock()
+
+  def __len__(self) -> int:
+    return self.count
+
+  def write(self, items:t.List[ListingItem]) -> None:
+    self._chunks.append((self._dump(item.to_row() for item in items),
+                         len(items)))
+    self.count += len(items)
+
+  def sorted(self, key:SRT=SRT.TYPE, asc:bool=True) -> t.Iterator[ListingItem]:
+    with self._lock:
+      runs = self._runs.get((key, asc))
+      if runs is None:
+        runs = self._runs[(key, asc)] = self._sort(key, asc)
+    rows = self._merge(runs, sort_key(key, asc, row=True))
+    return map(ListingItem.from_row, rows)
+
+  def _sort(self, key:SRT, asc:bool) -> t.List[str]:
+    keyfn = sort_key(key, asc, row=True)
+    runs = []
+    for chunk, size in self._chunks:
+      rows = self._load(chunk)
+      while size > 0:
+        nbytes = size * ITEM_COST
+        if self.budget is not None: # a starved budget still gets tiny runs
+          nbytes = self.budget.acquire_upto(nbytes,
+                                            min(size, MIN_RUN) * ITEM_COST)
+        try:
+          n = nbytes // ITEM_COST
+          runs.append(self._dump(sorted(islice(rows, n), key=keyfn)))
+        finally:
+          if self.budget is not None:
+            self.budget.release(nbytes)
+        size -= n
+      rows.close()
+
+    while len(runs) > self.fanin: # so the final merge opens few files
+      merged = []
+      for i in range(0, len(runs), self.fanin):
+        group = runs[i:i + self.fanin]
+        merged.append(self._dump(self._merge(group, keyfn)))
+        for name in group:
+          os.unlink(name)
+      runs = merged
+    return runs
+
+  def _merge(self, runs:t.List[str], keyfn:t.Callable,
+                   frames:int=16) -> t.Iterator[tuple]:
+    # up to `frames` frames are buffered per run, at least one
+    frame = self.batch * ITEM_COST
+    nbytes = len(runs) * frame * frames
+    if self.budget is not None:
+      nbytes = self.budget.acquire_upto(nbytes, len(runs) * frame)
+    try:
+      frames = max(1, nbytes // (len(runs) * frame)) if runs else 1
+      yield from heapq.merge(*(self._load(x, frames) for x in runs), key=keyfn)
+    finally:
+      if self.budget is not None:
+        self.budget.release(nbytes)
+
+  def _dump(self, rows:t.Iterable[tuple]) -> str:
+    fd, name = tempfile.mkstemp(dir=self._dir.name)
+    with open(fd, "wb") as f:
+      batch = []
+      for row in rows:
+        batch.append(row)
+        if len(batch) == self.batch:
+          pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+          batch = []
+      pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+    return name
+
+  def _load(self, name:str, frames:int=1) -> t.Iterator[tuple]:
+    with open(name, "rb") as f:
+      while True:
+        rows = []
+        try:
+          for _ in range(frames):
+            rows += pickle.load(f)
+        except EOFError:
+          yield from rows
+          return
+        yield from rows
+
+
+# 153MiB / 123006 inodes, measured with an older version (see below)
+ITEM_COST = 1304
+RESERVE_STEP = 1024 * ITEM_COST
+MIN_RUN = 1024
+
+def scan_directory(path:PathLike, limit:int=None, budget:MemoryBudget=None,
+                   fd:int=None) -> t.Union[t.List[ListingItem], SpilledListing]:
+  """
+  List `path` presorted by mime and name. When the listing would take more
+  than `limit` bytes, or more than is left in `budget`, it's spilled to disk
+  and a `SpilledListing` is returned. A returned list keeps its
+  `len(items) * ITEM_COST` bytes reserved in `budget` for the caller to free.
+  An open `fd` of the directory is scanned instead of looking `path` up again.
+  """
+  #best way to handle big directories.
+  #The other way would be to just cache the filesystem and update it on a
+  #constant interval of time using a seperate thread, but that was taking up
+  #too much memory (153MiB for 123006 inodes).
+  def items():
+    with os.scandir(path if fd is None else fd) as it:
+      for entry in it:
+        try: # a symlink can point out of the root, so it's not followed
+          yield ListingItem(os.path.join(path, entry.name), False,
+                            entry.stat(follow_symlinks=False))
+        except OSError as err: # removed meanwhile
+          if err.errno in (errno.ENOENT, errno.ELOOP):
+            continue
+          raise
+
+  sniff = lambda items: _multi_mimetype([x.path for x in items])
+  return collect_listing(items(), sniff, limit, budget)
+
+
+def collect_listing(items:t.Iterable[ListingItem],
+                    sniff:t.Callable[[t.List[ListingItem]], t.List[str]],
+                    limit:int=None, budget:MemoryBudget=None
+                    ) -> t.Union[t.List[ListingItem], SpilledListing]:
+  """
+  The budgeting and spilling of `scan_directory`, for `items` that don't
+  have a mime yet, `sniff` returns the mimes of a chunk of them.
+  """
+  def with_mimes(items):
+    tally("sniffed", len(items))
+    with phase("mime"):
+      mimes = sniff(items)
+    for item, mime in zip(items, mimes):
+      item.mime = mime
+    return items
+
+  chunk, spill, reserved = [], None, 0
+  try:
+    for item in items:
+      while (len(chunk) + 1) * ITEM_COST > reserved:
+        step = RESERVE_STEP if limit is None \
+               else min(RESERVE_STEP, limit - reserved)
+        if spill is None and step > 0 \
+        and (budget is None or budget.acquire(step)):
+          reserved += step
+          continue
+        if len(chunk) >= MIN_RUN: # a starved budget shouldn't write tiny runs
+          spill = spill or SpilledListing(budget)
+          spill.write(with_mimes(chunk))
+          chunk = []
+        break
+      chunk.append(item)
+
+    with_mimes(chunk)
+    if spill is not None:
+      spill.write(chunk)
+  except BaseException:
+    if budget is not None:
+      budget.release(reserved)
+    raise
+
+  if spill is not None:
+    if budget is not None:
+      budget.release(reserved)
+    return spill
+  if budget is not None:
+    budget.release(reserved - len(chunk) * ITEM_COST)
+  chunk.sort(key=lambda x: getattr(x, "name")) #presort by name for easy
+  chunk.sort(key=lambda x: getattr(x, "mime")) #storage and operations.
+  return chunk
+
 
 @dataclass(init=False)
 class ViewProxy(object):
   __slots__ = ("path", "urlpath", "items", "iconpath", "basepath", "key", "asc",
-               "_g")
+               "listing", "_g")
 
   path: PathLike
   urlpath: str
-  items: t.List[ListingItem]
+  items: t.Iterable[ListingItem]
+  listing: t.Optional[SpilledListing]
   key: SRT
   asc: bool
 
   def __init__(self, path:PathLike, urlpath:str, basepath:PathLike,
-                     iconpath:str=..., key:SRT=SRT.TYPE, asc:bool=True):
-    self.path = realpath(path)
+                     iconpath:str=..., key:SRT=SRT.TYPE, asc:bool=True,
+                     service:"ListingService"=None, fd:int=None,
+                     backend:"Backend"=None):
+    # with an open `fd`, `path` has to be the realpath it was opened from
+    self.path = realpath(path) if fd is None and backend is None else path
     self.basepath = basepath
     self.urlpath = urlpath
     self.key = key
@@ -331,65 +1054,892 @@ class ViewProxy(object):
     else:
       self.iconpath = iconpath
 
-    #best way to handle big directories.
-    #The other way would be to just cache the filesystem and update it on a
-    #constant interval of time using a seperate thread, but that was taking up
-    #too much memory (153MiB for 123006 inodes).
-    inodes = sorted([os.path.join(self.path, x) for x in listdir(self.path)])
-    good_inodes = []
-    self.items = []
-    for inode in inodes:
-      try:
-        self.items.append(ListingItem(inode, initmime=False))
-        good_inodes.append(inode)
-      except OSError as err:
-        if err.errno == 2:
-          continue
-        raise
-
-    good_inodes = tuple(good_inodes)
-    for idx, mime in enumerate(multi_mimetype(good_inodes)):
-      self.items[idx].mime = mime
-    self.items.sort(key=lambda x: getattr(x, "name")) #presort by name for easy
-    self.items.sort(key=lambda x: getattr(x, "mime")) #storage and operations.
+    with phase("scan"):
+      listing = (service or listing_service).get(self.path, fd, backend)
+    if isinstance(listing, SpilledListing):
+      self.listing = listing
+      with phase("sort"): # the runs, their last merge is streamed
+        self.items = listing.sorted(key, asc)
+    else:
+      # the snapshot is shared with other requests, so sort a copy of it
+      self.listing = None
+      with phase("sort"):
+        self.items = list(listing)
 
   def sort(self, key:SRT=SRT.TYPE, asc:bool=True) -> None:
+    if self.listing is not None:
+      with phase("sort"):
+        self.items = self.listing.sorted(key, asc)
+      return
     attr = ["lastmod", "name", "size", "mime"][key]
-    self.items.sort(key=lambda x:getattr(x, attr), reverse=not asc)
+    with phase("sort"):
+      self.items.sort(key=lambda x:getattr(x, attr), reverse=not asc)
+
+
+##==============================================================================
+##                                  watcher                                   ##
+
+class DirWatcher(threading.Thread):
+  """
+  Polls a single directory and fans the changes out to every subscriber.
+  There is at most one watcher per realpath, it dies with its last subscriber.
+  Each queued delta is a `(added, removed, modified)` tuple, where `added` and
+  `modified` are lists of `ListingItem` and `removed` is a list of basenames.
+  A `None` is queued when the watcher dies, subscribers have to resubscribe.
+  """
+  _registry: t.Dict[str, "DirWatcher"] = {}
+  _lock = threading.Lock()
+
+  def __init__(self, path:PathLike, interval:float):
+    super().__init__(name=f"DirWatcher({path})", daemon=True)
+    self.path = path
+    self.interval = interval
+    self.subscribers: t.List[queue.SimpleQueue] = []
+    self.snapshot = self.scan()
+
+  @classmethod
+  def subscribe(cls, path:PathLike, interval:float=2.0) -> queue.SimpleQueue:
+    path = realpath(path)
+    q = queue.SimpleQueue()
+    with cls._lock:
+      watcher = cls._registry.get(path)
+      if watcher is not None:
+        watcher.subscribers.append(q)
+        return q
+
+    # the first scan can take a while, every other feed would wait on the lock
+    fresh = cls(path, interval)
+    with cls._lock:
+      watcher = cls._registry.get(path)
+      if watcher is None: # nobody beat us to it
+        watcher = cls._registry[path] = fresh
+        watcher.start()
+      watcher.subscribers.append(q)
+    return q
+
+  @classmethod
+  def unsubscribe(cls, path:PathLike, q:queue.SimpleQueue) -> None:
+    path = realpath(path)
+    with cls._lock:
+      watcher = cls._registry.get(path)
+      if watcher is None:
+        return
+      if q in watcher.subscribers:
+        watcher.subscribers.remove(q)
+      if not watcher.subscribers: # the thread notices this on its next tick
+        del cls._registry[path]
+
+  def scan(self) -> t.Dict[str, t.Tuple[int, int]]:
+    snapshot = {}
+    try:
+      with os.scandir(self.path) as it:
+        for entry in it:
+          try: # symlinks aren't followed, like in `scan_directory`
+            stat = entry.stat(follow_symlinks=False)
+          except OSError: # gone, no permission...
+            continue
+          snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    except FileNotFoundError: ...
+    return snapshot
+
+  def diff(self, old:dict, new:dict) -> t.Optional[tuple]:
+    removed = [name for name in old if name not in new]
+    added = [name for name in new if name not in old]
+    modified = [name for name in new if name in old and old[name] != new[name]]
+    if not (removed or added or modified):
+      return None
+
+    def load(names):
+      items = []
+      for name in names:
+        try:
+          path = os.path.join(self.path, name)
+          items.append(ListingItem(path, False, os.lstat(path)))
+        except FileNotFoundError: # gone again before we got to it
+          removed.append(name)
+        except OSError: # unreadable for now, retried on the next tick
+          if name in old:
+            new[name] = old[name]
+          else:
+            del new[name]
+      return items
+
+    added, modified = load(added), load(modified)
+    items = added + modified
+    # uncached, a modified file is likely to have changed its type too
+    for item, mime in zip(items, _multi_mimetype([x.path for x in items])):
+      item.mime = mime
+    return (added, removed, modified) if added or removed or modified else None
+
+  def run(self):
+    try:
+      while True:
+        time.sleep(self.interval)
+        with self._lock:
+          if self._registry.get(self.path) is not self:
+            return
+
+        try:
+          snapshot = self.scan()
+          delta = self.diff(self.snapshot, snapshot)
+        except (OSError, CalledProcessError): # try again on the next tick
+          continue
+        self.snapshot = snapshot
+        if delta is None:
+          continue
+
+        with self._lock:
+          subscribers = list(self.subscribers)
+        for q in subscribers:
+          q.put(delta)
+    finally: # never leave a dead watcher behind for new subscribers
+      with self._lock:
+        if self._registry.get(self.path) is self:
+          del self._registry[self.path]
+        subscribers, self.subscribers = self.subscribers, []
+      for q in subscribers:
+        q.put(None)
+
+
+##==============================================================================
+##                                  backends                                  ##
+
+class Entry(t.NamedTuple):
+  name: str
+  isdir: bool
+  size: int
+  mtime: float
+
+
+class Backend(metaclass=ABCMeta):
+  """
+  Where listings and files come from. Paths are relative to the root of the
+  backend, "/" separated, and "." is the root itself.
+  `capabilities` tells `DirView` which faster paths it can take:
+    - "fd": paths live on the local filesystem, `resolve` opens them confined
+      to the root and `DirView` serves the descriptors itself
+    - "batch_stat": `list` returns complete entries, no `stat` per entry needed
+    - "pread": `locate` can point at file data stored as is in a local file,
+      which is then read with `pread` and readahead hints
+  """
+  capabilities: t.FrozenSet[str] = frozenset()
+
+  @abstractmethod
+  def stat(self, path:str) -> Entry:
+    """raises `FileNotFoundError` for missing paths"""
+
+  @abstractmethod
+  def list(self, path:str) -> t.Iterable[Entry]:
+    """without "batch_stat", only the names of the entries have to be right"""
+
+  @abstractmethod
+  def open_range(self, path:str, offset:int, length:int) -> t.Iterator[bytes]:...
+
+  def locate(self, path:str) -> t.Optional[t.Tuple[PathLike, int]]:
+    """the local file and offset holding the data of `path` as is, if any"""
+    return None
+
+  def sniff(self, path:str, entries:t.Sequence[Entry]) -> t.List[str]:
+    """the mimetypes of `entries` of the directory `path`"""
+    return ["inode/directory" if x.isdir else
+            mimetypes.guess_type(x.name)[0] or "application/octet-stream"
+            for x in entries]
+
+  @staticmethod
+  def join(path:str, name:str) -> str:
+    return name if path == "." else f"{path}/{name}"
+
+
+class LocalBackend(Backend):
+  """
+  The local filesystem under `root`. Every path goes through `resolve`, so
+  nothing outside of the root can be reached, symlinks included.
+  """
+  capabilities = frozenset({"fd", "batch_stat"})
+
+  def __init__(self, root:PathLike):
+    self.root = realpath(root)
+    self.rootfd = os.open(self.root, O_PATH | os.O_DIRECTORY | os.O_CLOEXEC)
+
+  def resolve(self, path:str) -> Resolved:
+    """raises `ResolveError`, the caller has to close the result"""
+    return resolve(self.root, self.rootfd, path)
+
+  def _resolve(self, path:str) -> Resolved:
+    try:
+      return self.resolve(path)
+    except ResolveError as err:
+      if err.status == 404:
+        raise FileNotFoundError(path) from None
+      raise PermissionError(path) from None
+
+  def stat(self, path:str) -> Entry:
+    resolved = self._resolve(path)
+    resolved.close()
+    return Entry(posixpath.basename(path), resolved.isdir,
+                 resolved.stat.st_size, resolved.stat.st_mtime)
+
+  def list(self, path:str) -> t.Iterator[Entry]:
+    resolved = self._resolve(path)
+    try:
+      if not resolved.isdir:
+        raise NotADirectoryError(path)
+      with os.scandir(resolved.fd) as it:
+        for entry in it:
+          try: # a symlink can point out of the root, so it's not followed
+            stat = entry.stat(follow_symlinks=False)
+          except OSError: # removed meanwhile
+            continue
+          yield Entry(entry.name, st.S_ISDIR(stat.st_mode), stat.st_size,
+                      stat.st_mtime)
+    finally:
+      resolved.close()
+
+  def open_range(self, path:str, offset:int, length:int) -> t.Iterator[bytes]:
+    resolved = self._resolve(path)
+    try:
+      yield from read_range(resolved.path, offset, length, fd=resolved.fd)
+    finally:
+      resolved.close()
+
+  def sniff(self, path:str, entries:t.Sequence[Entry]) -> t.List[str]:
+    resolved = self._resolve(path)
+    resolved.close()
+    return _multi_mimetype([os.path.join(resolved.path, x.name)
+                            for x in entries])
+
+
+class ArchiveBackend(Backend):
+  """
+  A read-only view into a tar or zip archive, browsed without extracting it.
+  The members are indexed once. Members stored without compression
+  (everything in a plain .tar, stored members of a .zip) remember where their
+  data starts, so ranges of them are read straight out of the archive.
+  """
+  def __init__(self, archive:PathLike):
+    self.archive = archive
+    self.mtime = os.stat(archive).st_mtime
+    self._entries: t.Dict[str, Entry] = {}
+    self._children: t.Dict[str, t.Dict[str, None]] = {".": {}}
+    self._offsets: t.Dict[str, int] = {}
+    self._members: t.Dict[str, t.Union[tarfile.TarInfo, zipfile.ZipInfo]] = {}
+    self.iszip = zipfile.is_zipfile(archive)
+    if self.iszip:
+      self._index_zip()
+    else:
+      self._index_tar()
+
+    self.capabilities = frozenset({"batch_stat"} |
+                                  ({"pread"} if self._offsets else set()))
+
+  def _index_tar(self) -> None:
+    try: # an uncompressed tarball can be read in place
+      archive, inplace = tarfile.open(self.archive, "r:"), True
+    except tarfile.ReadError:
+      archive, inplace = tarfile.open(self.archive, "r:*"), False
+    with archive:
+      for member in archive:
+        if member.isdir() or member.isfile():
+          offset = member.offset_data \
+                   if inplace and member.isfile() and not member.issparse() \
+                   else None
+          self._add(member.name, member.isdir(), member.size, member.mtime,
+                    offset, member)
+
+  def _index_zip(self) -> None:
+    with zipfile.ZipFile(self.archive) as archive, \
+         open(self.archive, "rb") as f:
+      for info in archive.infolist():
+        offset = None
+        if info.compress_type == zipfile.ZIP_STORED and not info.is_dir() \
+        and not info.flag_bits & 0x1: # not encrypted
+          # the data follows the local header, whose extra field can differ
+          # from the one in the central directory
+          f.seek(info.header_offset)
+          header = f.read(30)
+          if header[:4] == b"PK\x03\x04":
+            namelen, extralen = struct.unpack("<HH", header[26:30])
+            offset = info.header_offset + 30 + namelen + extralen
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        self._add(info.filename, info.is_dir(), info.file_size, mtime,
+                  offset, info)
+
+  def _add(self, name:str, isdir:bool, size:int, mtime:float,
+                 offset:t.Optional[int], member) -> None:
+    path = posixpath.normpath("/" + name).lstrip("/")
+    if not path:
+      return
+    self._entries[path] = Entry(posixpath.basename(path), isdir, size, mtime)
+    self._members[path] = member
+    if offset is not None:
+      self._offsets[path] = offset
+    if isdir:
+      self._children.setdefault(path, {})
+
+    # archives don't have to contain the parents of their members
+    while True:
+      parent = posixpath.dirname(path) or "."
+      self._children.setdefault(parent, {})[path] = None
+      if parent == "." or parent in self._entries:
+        break
+      self._entries[parent] = Entry(posixpath.basename(parent), True, 0, mtime)
+      path = parent
+
+  def stat(self, path:str) -> Entry:
+    if path == ".":
+      return Entry(".", True, 0, self.mtime)
+    try:
+      return self._entries[path]
+    except KeyError:
+      raise FileNotFoundError(path) from None
+
+  def list(self, path:str) -> t.Iterator[Entry]:
+    if path not in self._children:
+      raise FileNotFoundError(path)
+    return (self._entries[x] for x in self._children[path])
+
+  def locate(self, path:str) -> t.Optional[t.Tuple[PathLike, int]]:
+    offset = self._offsets.get(path)
+    return None if offset is None else (self.archive, offset)
+
+  def open_range(self, path:str, offset:int, length:int) -> t.Iterator[bytes]:
+    location = self.locate(path)
+    if location is not None:
+      return read_range(location[0], location[1] + offset, length)
+    return self._read_member(self._members[path], offset, length)
+
+  def _read_member(self, member, offset:int, length:int,
+                         chunksize:int=1<<16) -> t.Iterator[bytes]:
+    # compressed data has to be inflated from the start of the member
+    if self.iszip:
+      archive = zipfile.ZipFile(self.archive)
+      f = archive.open(member)
+    else:
+      archive = tarfile.open(self.archive, "r:*")
+      f = archive.extractfile(member)
+    with archive, f:
+      f.seek(offset)
+      while length > 0:
+        chunk = f.read(min(chunksize, length))
+        if not chunk:
+          break
+        length -= len(chunk)
+        yield chunk
+
+
+class S3Backend(Backend):
+  """
+  The objects of an S3 compatible bucket (optionally below `prefix`), listed
+  with ListObjectsV2 and "/" as the delimiter. Requests are signed with AWS
+  SigV4 when keys are given. Point `endpoint` at any compatible server
+  (minio, moto, ...) to use it instead of AWS.
+  """
+  capabilities = frozenset({"batch_stat"})
+
+  def __init__(self, bucket:str, endpoint:str="https://s3.amazonaws.com",
+                     prefix:str="", region:str="us-east-1",
+                     access_key:str=None, secret_key:str=None,
+                     timeout:float=30.0):
+    self.bucket = bucket
+    self.endpoint = endpoint.rstrip("/")
+    self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+    self.region = region
+    self.access_key = access_key
+    self.secret_key = secret_key
+    self.timeout = timeout
+
+  def _request(self, method:str, key:str="", query:t.Dict[str, str]=None,
+                     headers:t.Dict[str, str]=None):
+    path = quote(f"/{self.bucket}/{key}" if key else f"/{self.bucket}/",
+                 safe="/~")
+    query = "&".join(f"{quote(k, safe='~')}={quote(v, safe='~')}"
+                     for k, v in sorted((query or {}).items()))
+    headers = dict(headers or {})
+    if self.access_key:
+      headers.update(self._sign(method, path, query))
+    url = f"{self.endpoint}{path}" + (f"?{query}" if query else "")
+    req = urllib.request.Request(url, method=method, headers=headers)
+    try:
+      return urllib.request.urlopen(req, timeout=self.timeout)
+    except urllib.error.HTTPError as err:
+      if err.code == 404:
+        raise FileNotFoundError(key) from None
+      if err.code == 403:
+        raise PermissionError(key) from None
+      raise
+
+  def _sign(self, method:str, path:str, query:str) -> t.Dict[str, str]:
+    now = datetime.now(timezone.utc)
+    amzdate = now.strftime(r"%Y%m%dT%H%M%SZ")
+    scope = f"{amzdate[:8]}/{self.region}/s3/aws4_request"
+    headers = {"host": urlparse(self.endpoint).netloc,
+               "x-amz-content-sha256": "UNSIGNED-PAYLOAD",
+               "x-amz-date": amzdate}
+    signed = ";".join(headers)
+    canonical = "\n".join([method, path, query,
+                           *(f"{k}:{v}" for k, v in headers.items()), "",
+                           signed, "UNSIGNED-PAYLOAD"])
+    tosign = "\n".join(["AWS4-HMAC-SHA256", amzdate, scope,
+                        sha256(canonical.encode("utf8")).hexdigest()])
+
+    key = f"AWS4{self.secret_key}".encode("utf8")
+    for part in (amzdate[:8], self.region, "s3", "aws4_request", tosign):
+      key = hmac.new(key, part.encode("utf8"), "sha256").digest()
+    del headers["host"] # urllib sets it on its own
+    headers["Authorization"] = (
+      f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+      f"SignedHeaders={signed}, Signature={key.hex()}")
+    return headers
+
+  def _key(self, path:str) -> str:
+    return self.prefix if path == "." else self.prefix + path
+
+  def _list(self, prefix:str, maxkeys:int=1000) -> t.Iterator[ET.Element]:
+    query = {"list-type": "2", "delimiter": "/", "prefix": prefix,
+             "max-keys": str(maxkeys)}
+    while True:
+      with self._request("GET", query=query) as resp:
+        root = ET.parse(resp).getroot()
+      ns = root.tag[:root.tag.index("}") + 1] if root.tag[0] == "{" else ""
+      yield from root.iter(f"{ns}Contents")
+      yield from root.iter(f"{ns}CommonPrefixes")
+      token = root.findtext(f"{ns}NextContinuationToken")
+      if root.findtext(f"{ns}IsTruncated") != "true" or not token:
+        return
+      query["continuation-token"] = token
+
+  def stat(self, path:str) -> Entry:
+    if path != ".":
+      try:
+        with self._request("HEAD", self._key(path)) as resp:
+          mtime = parsedate_to_datetime(resp.headers["Last-Modified"])
+          return Entry(posixpath.basename(path), False,
+                       int(resp.headers["Content-Length"]), mtime.timestamp())
+      except FileNotFoundError: ... # could still be a "directory"
+      if next(self._list(self._key(path) + "/", maxkeys=1), None) is None:
+        raise FileNotFoundError(path)
+    return Entry(posixpath.basename(path), True, 0, 0.0)
+
+  def list(self, path:str) -> t.Iterator[Entry]:
+    prefix = self._key(path) + ("/" if path != "." else "")
+    for elem in self._list(prefix):
+      ns = elem.tag[:elem.tag.index("}") + 1] if elem.tag[0] == "{" else ""
+      key = elem.findtext(f"{ns}Key")
+      if key is None: # a CommonPrefix, that is a "directory"
+        name = elem.findtext(f"{ns}Prefix")[len(prefix):].rstrip("/")
+        yield Entry(name, True, 0, 0.0)
+      elif key != prefix: # skip the marker object of the directory itself
+        mtime = datetime.fromisoformat(
+          elem.findtext(f"{ns}LastModified").replace("Z", "+00:00"))
+        yield Entry(key[len(prefix):], False, int(elem.findtext(f"{ns}Size")),
+                    mtime.timestamp())
+
+  def open_range(self, path:str, offset:int, length:int,
+                       chunksize:int=1<<16) -> t.Iterator[bytes]:
+    if length <= 0:
+      return
+    headers = {"Range": f"bytes={offset}-{offset + length - 1}"}
+    with self._request("GET", self._key(path), headers=headers) as resp:
+      # a server that ignores `Range` sends the whole object, cut it out
+      skip = 0 if resp.status == 206 else offset
+      while length > 0:
+        chunk = resp.read(min(chunksize, skip + length))
+        if not chunk:
+          break
+        if skip:
+          chunk, skip = chunk[skip:], max(skip - len(chunk), 0)
+        chunk = chunk[:length]
+        length -= len(chunk)
+        if chunk:
+          yield chunk
+    if length > 0: # the response already promised the full length
+      raise EOFError(f"{path}: object shorter than requested")
+
+
+def scan_backend(backend:Backend, path:str, limit:int=None,
+                 budget:MemoryBudget=None
+                 ) -> t.Union[t.List[ListingItem], SpilledListing]:
+  """like `scan_directory`, but for a non-local `Backend`"""
+  def items():
+    for entry in backend.list(path):
+      if "batch_stat" not in backend.capabilities:
+        entry = backend.stat(backend.join(path, entry.name))
+      yield ListingItem.from_entry(backend.join(path, entry.name), entry, None)
+
+  def sniff(items):
+    return backend.sniff(path, [Entry(x.basename, x.isdir, x.size,
+                                      x.lastmod.timestamp()) for x in items])
+  return collect_listing(items(), sniff, limit, budget)
+
+
+def send_backend_file(backend:Backend, path:str, entry:Entry,
+                      max_age:int=3600, readahead:int=0):
+  mime = backend.sniff(posixpath.dirname(path) or ".", [entry])[0]
+  mtime_ns = int(entry.mtime * 10**9)
+  meta = FileMeta(entry.size, datetime.fromtimestamp(int(entry.mtime),
+                  timezone.utc), mime, f"{mtime_ns:x}-{entry.size:x}")
+
+  # data stored as is in a local file can be read with `pread` and readahead
+  location = backend.locate(path) if "pread" in backend.capabilities \
+             else None
+  if location is None:
+    reader = partial(backend.open_range, path)
+  else:
+    file, base = location
+    def reader(offset, length):
+      return read_range(file, base + offset, length, readahead)
+  return send_range(meta, reader, max_age)
 
 
 ##==============================================================================
 ##                                  cache                                     ##
 
-class AbstractView(metaclass=ABCMeta):
-  def __init__(self):
+class ListingService:
+  """
+  Process-wide cache of directory listings, shared by every `DirView` mount.
+  Snapshots are keyed on the directory realpath and validated by its mtime.
+  Concurrent requests for the same (realpath, mtime) wait for a single scan.
+  A snapshot older than `ttl` seconds (but with an unchanged mtime) is still
+  served for another `stale` seconds, while it is refreshed in the background.
+  A listing bigger than `request_budget` bytes, or than what the cached ones
+  leave of `process_budget`, is spilled to disk (see `scan_directory`).
+  Listings of a `Backend` are validated by age alone: S3 has no directory
+  mtimes and an archive is indexed once, so a stat would only cost a round trip.
+  """
+  def __init__(self, ttl:float=5.0, stale:float=60.0, maxsize:int=256,
+                     request_budget:int=64<<20, process_budget:int=512<<20):
+    self.ttl = ttl
+    self.stale = stale
+    self.maxsize = maxsize
+    self.request_budget = request_budget
+    self.budget = MemoryBudget(process_budget)
+    self._cache: "OrderedDict[str, t.Tuple[int, float, t.Any]]" = OrderedDict()
+    self._inflight: t.Dict[t.Tuple[str, int], Future] = {}
+    self._lock = threading.Lock()
+
+  def get(self, path:PathLike, fd:int=None, backend:Backend=None
+          ) -> t.Union[t.List[ListingItem], SpilledListing]:
+    """
+    `path` has to be a realpath (or a path of `backend`), the returned list
+    must not be mutated
+    """
+    if backend is not None:
+      key, mtime = (backend, path), 0
+    else:
+      key = path
+      mtime = (os.stat(path) if fd is None else os.fstat(fd)).st_mtime_ns
+    with self._lock:
+      entry = self._cache.get(key)
+      if entry is not None and entry[0] == mtime:
+        self._cache.move_to_end(key)
+        age = time.monotonic() - entry[1]
+        if age < self.ttl:
+          return entry[2]
+        if age < self.ttl + self.stale:
+          future, leader = self._submit(key, mtime)
+          if leader:
+            threading.Thread(target=self._scan, args=(key, mtime, future),
+                             daemon=True).start()
+          return entry[2]
+      future, leader = self._submit(key, mtime)
+    if leader:
+      self._scan(key, mtime, future, fd)
+    return future.result()
+
+  def has(self, path:PathLike, backend:Backend=None) -> bool:
+    """whether `get` can still answer from the cache, without a scan"""
+    key = path if backend is None else (backend, path)
+    with self._lock:
+      entry = self._cache.get(key)
+    return entry is not None and \
+           time.monotonic() - entry[1] < self.ttl + self.stale
+
+  def clear(self) -> None:
+    with self._lock:
+      while self._cache:
+        self._evict()
+
+  def _evict(self) -> None:
+    # has to be called with `self._lock` held
+    _, (_, _, listing) = self._cache.popitem(last=False)
+    if isinstance(listing, list):
+      self.budget.release(len(listing) * ITEM_COST)
+
+  def _submit(self, key, mtime:int) -> t.Tuple[Future, bool]:
+    # has to be called with `self._lock` held, the caller that gets
+    # `leader=True` is responsible for running `_scan` on the future
+    future = self._inflight.get((key, mtime))
+    if future is not None:
+      return future, False
+    future = self._inflight[(key, mtime)] = Future()
+    return future, True
+
+  def _scan(self, key, mtime:int, future:Future, fd:int=None) -> None:
+    # `key` is either a realpath or a `(backend, path)` pair
+    try:
+      with self._lock: # make room for a full request before scanning
+        while self._cache and \
+        self.budget.used + self.request_budget > self.budget.limit:
+          self._evict()
+      if isinstance(key, tuple):
+        items = scan_backend(*key, self.request_budget, self.budget)
+      else:
+        items = scan_directory(key, self.request_budget, self.budget, fd)
+    except Exception as err:
+      future.set_exception(err)
+    else:
+      with self._lock:
+        if key in self._cache:
+          self._cache.move_to_end(key, last=False)
+          self._evict()
+        self._cache[key] = (mtime, time.monotonic(), items)
+        while len(self._cache) > self.maxsize:
+          self._evict()
+      future.set_result(items)
+    finally:
+      with self._lock:
+        self._inflight.pop((key, mtime), None)
+
+
+listing_service = ListingService()
+
+
+def make_thumbnail(data:bytes, dst:PathLike, size:int) -> None:
+  # runs in a worker process of `ThumbnailService`, it gets the image itself
+  # rather than a path, which could have been swapped for a symlink since
+  with Image.open(BytesIO(data)) as img:
+    img.draft("RGB", (size, size)) # lets jpeg decode at a fraction of the size
+    img.thumbnail((size, size))
+    if img.mode not in ("RGB", "L"):
+      img = img.convert("RGB")
+    fd, tmp = tempfile.mkstemp(".tmp", dir=os.path.dirname(dst))
+    try:
+      with os.fdopen(fd, "wb") as f:
+        img.save(f, "JPEG", quality=85)
+      os.replace(tmp, dst)
+    except BaseException:
+      os.unlink(tmp)
+      raise
+
+def private_dir(path:PathLike) -> None:
+  """create the directory `path`, making sure only we can write into it"""
+  os.makedirs(path, 0o700, exist_ok=True)
+  info = os.lstat(path)
+  if not st.S_ISDIR(info.st_mode) or info.st_mode & 0o077 or \
+  (hasattr(os, "getuid") and info.st_uid != os.getuid()):
+    raise PermissionError(f"{path} isn't a private directory")
+
+
+class ThumbnailService:
+  """
+  Generates thumbnails on demand, on a process pool, using Pillow.
+  They are kept in a disk cache under `cache_dir`, content addressed by the
+  device, inode, size and mtime of the source, so changed files get new ones.
+  Sources that failed (or are bigger than `max_bytes`) aren't retried until
+  they change, the last `maxfailed` of them are remembered.
+  Without a `cache_dir`, a private one in the user's cache directory is used.
+  """
+  def __init__(self, cache_dir:PathLike=None, size:int=128,
+                     workers:int=None, timeout:float=30.0,
+                     max_bytes:int=64<<20, maxfailed:int=4096):
+    self.cache_dir = cache_dir
+    self._private = cache_dir is None
+    if cache_dir is None:
+      cache = os.environ.get("XDG_CACHE_HOME") or expanduser("~/.cache")
+      self.cache_dir = os.path.join(cache, "flask_dirview", "thumbs")
+    self.size = size
+    self.workers = workers
+    self.timeout = timeout
+    self.max_bytes = max_bytes
+    self.maxfailed = maxfailed
+    self._pool = None
+    self._inflight: t.Dict[str, Future] = {}
+    self._failed: "OrderedDict[str, None]" = OrderedDict()
+    self._lock = threading.Lock()
+
+  @property
+  def available(self) -> bool:
+    return Image is not None
+
+  def key(self, stat:os.stat_result) -> str:
+    ident = f"{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+    return sha256(f"{ident}:{self.size}".encode("utf8")).hexdigest()
+
+  def get(self, fd:int, stat:os.stat_result) -> str:
+    """
+    the path of the cached thumbnail of the file open as `fd` (an `O_PATH`
+    one is fine), generating it if needed
+    """
+    key = self.key(stat)
+    dst = os.path.join(self.cache_dir, key[:2], f"{key}.jpg")
+    if os.path.exists(dst):
+      return dst
+    if key in self._failed:
+      raise ValueError("no thumbnail for this file")
+
+    with self._lock:
+      future = self._inflight.get(key)
+    if future is None:
+      if stat.st_size > self.max_bytes:
+        self._fail(key)
+        raise ValueError("image too big to be thumbnailed")
+      with os.fdopen(reopen(fd), "rb") as f:
+        data = f.read(self.max_bytes)
+      with self._lock:
+        future = self._inflight.get(key)
+        if future is None:
+          if self._pool is None:
+            # forking a multithreaded server can deadlock the children
+            methods = multiprocessing.get_all_start_methods()
+            context = "forkserver" if "forkserver" in methods else "spawn"
+            self._pool = ProcessPoolExecutor(
+              self.workers, mp_context=multiprocessing.get_context(context))
+          if self._private: # checked once, before anything is written
+            private_dir(self.cache_dir)
+            self._private = False
+          os.makedirs(os.path.dirname(dst), 0o700, exist_ok=True)
+          future = self._pool.submit(make_thumbnail, data, dst, self.size)
+          self._inflight[key] = future
+        else:
+          data = None
+      if data is not None: # outside the lock, it may run right away
+        future.add_done_callback(partial(self._done, key))
+    future.result(self.timeout)
+    return dst
+
+  def _done(self, key:str, future:Future) -> None:
+    self._inflight.pop(key, None)
+    if not future.cancelled() and future.exception() is not None:
+      self._fail(key)
+
+  def _fail(self, key:str) -> None:
+    with self._lock:
+      self._failed[key] = None
+      while len(self._failed) > self.maxfailed:
+        self._failed.popitem(last=False)
+
+
+class BaseView(metaclass=ABCMeta):
+  """
+  Base of every frontend, the page itself is produced by `render_template`
+  and, for listings too big to be held in memory, `stream_template`.
+  """
+  def __init__(self, **options):
     #has_iconmap = bool(getattr(self, "iconmap", None))
     #has_iconfn  = bool(getattr(self, "icon", None))
-    self.template.globals.update(globals())
+    for name, value in options.items():
+      if not hasattr(self, name):
+        raise TypeError(f"{type(self).__name__} has no option {name!r}")
+      setattr(self, name, value)
 
     if hasattr(self, "__post_init__"):
       self.__post_init__()
 
-  def render_template(self, viewproxy:ViewProxy, **kwargs) -> str:
+  @staticmethod
+  def order(viewproxy:ViewProxy) -> t.Dict[str, str]:
     asc = viewproxy.asc
     key = viewproxy.key
-    order = {
+    return {
       "lastmod": "0" if (key == SRT.LASTMOD and asc) else "1",
       "name": "0" if (key == SRT.NAME and asc) else "1",
       "size": "0" if (key == SRT.SIZE and asc) else "1",
       "type": "0" if (key == SRT.TYPE and asc) else "1"}
+
+  @abstractmethod
+  def render_template(self, viewproxy:ViewProxy, **kwargs) -> str:...
+
+  def stream_template(self, viewproxy:ViewProxy, bufsize:int=1<<16,
+                            **kwargs) -> t.Iterator[str]:
+    """like `render_template`, but yields the page in `bufsize` pieces"""
+    yield self.render_template(viewproxy, **kwargs)
+
+  def render_delta(self, delta:tuple, iconpath:str) -> str:
+    """serialize a `DirWatcher` delta into the payload of a SSE event"""
+    def row(item):
+      data = {"basename": item.basename, "name": item.name, "mime": item.mime,
+              "size": item.size, "sizefmt": item.sizefmt,
+              "lastmodfmt": item.lastmodfmt}
+      if hasattr(self, "icon"):
+        data["icon"] = os.path.join(iconpath, self.icon(item))
+      return data
+
+    added, removed, modified = delta
+    return json.dumps({"add": [row(x) for x in added], "remove": removed,
+                       "modify": [row(x) for x in modified]},
+                      separators=(",", ":"))
+
+
+class AbstractView(BaseView):
+  """a frontend rendered by the jinja `template`"""
+  def __init__(self, **options):
+    self.template.globals.update(globals())
+    super().__init__(**options)
+
+  def render_template(self, viewproxy:ViewProxy, **kwargs) -> str:
+    order = self.order(viewproxy)
     return self.template.render(proxy=viewproxy, **kwargs, order=order)
 
+  def stream_template(self, viewproxy:ViewProxy, bufsize:int=1<<16,
+                            **kwargs) -> t.Iterator[str]:
+    order = self.order(viewproxy)
+    buf, size = [], 0
+    for part in self.template.generate(proxy=viewproxy, **kwargs, order=order):
+      buf.append(part)
+      size += len(part)
+      if size >= bufsize:
+        yield "".join(buf)
+        buf, size = [], 0
+    yield "".join(buf)
+
   @property
   @abstractmethod
   def template() -> Template:...
 
 
+class StringView(BaseView):
+  """
+  A frontend built with plain string formatting instead of a template, which
+  is several times faster and lighter on big listings. The page is `header`,
+  then `rows` (one string per item), then `footer`.
+  """
+  batch = 1024 # rows per streamed piece
+
+  def render_template(self, viewproxy:ViewProxy, **kwargs) -> str:
+    return "".join((self.header(viewproxy), *self.rows(viewproxy),
+                    self.footer(viewproxy)))
+
+  def stream_template(self, viewproxy:ViewProxy, bufsize:int=1<<16,
+                            **kwargs) -> t.Iterator[str]:
+    yield self.header(viewproxy)
+    rows = iter(self.rows(viewproxy))
+    while True:
+      piece = "".join(islice(rows, self.batch))
+      if not piece:
+        break
+      yield piece
+    yield self.footer(viewproxy)
+
+  @abstractmethod
+  def header(self, viewproxy:ViewProxy) -> str:...
+
+  @abstractmethod
+  def rows(self, viewproxy:ViewProxy) -> t.Iterable[str]:...
+
+  @abstractmethod
+  def footer(self, viewproxy:ViewProxy) -> str:...
+
+
 class DirView:
-  __slots__ = ("app", "vpath", "fpath", "uid", "_iconfn", "_viewfn", "frontend")
+  __slots__ = ("app", "vpath", "fpath", "uid", "_iconfn", "_viewfn", "frontend",
+               "watch_interval", "service", "max_age", "readahead", "root",
+               "rootfd", "thumbnails", "backend", "profiler")
 
-  def __init__(self, app:Scaffold, file_path:PathLike, view_path:str,
-                     frontend:AbstractView):
+  def __init__(self, app:Scaffold, file_path:t.Union[PathLike, Backend],
+                     view_path:str,
+                     frontend:BaseView, watch_interval:float=2.0,
+                     service:ListingService=None, max_age:int=3600,
+                     readahead:int=0, thumbnails:ThumbnailService=None,
+                     profiler:Profiler=None):
 
 
     if callable(frontend):
@@ -398,8 +1948,21 @@ class DirView:
       self.frontend = frontend
 
     self.app = app
-    self.fpath = file_path
+    self.backend = file_path if isinstance(file_path, Backend) \
+                   else LocalBackend(file_path)
+    self.fpath = getattr(self.backend, "root", ".")
     self.vpath = view_path
+    if "fd" in self.backend.capabilities:
+      self.root, self.rootfd = self.backend.root, self.backend.rootfd
+    else: # paths of other backends are resolved by the backend itself
+      self.root, self.rootfd = ".", None
+    self.watch_interval = watch_interval if self.rootfd is not None else 0
+    self.service = service or listing_service
+    self.max_age = max_age
+    self.readahead = readahead
+    self.thumbnails = thumbnails if thumbnails and thumbnails.available \
+                      and self.rootfd is not None else None
+    self.profiler = profiler
 
     is_static = (self.vpath == self.app.static_url_path)
     self.uid  = sha256(self.vpath.encode("utf8")).digest().hex()[2::4]
@@ -418,38 +1981,23 @@ class DirView:
     icon_rule = fr"/{self.uid}/icons/<name>"
     self.app.add_url_rule(icon_rule, None, self._iconfn)
 
-    def viewfn(filename):
-      dirpath = os.path.join(self.fpath, filename)
+    if self.thumbnails is not None:
+      thumbfn = partial(self._thumbfn)
+      thumbfn.__name__ = f"_thumbfn{self.uid}"
+      thumb_rule = fr"/{self.uid}/thumbs/<path:filename>"
+      self.app.add_url_rule(thumb_rule, None, thumbfn)
 
-      if not os.path.exists(dirpath):
-        return "<h1>Path doesn't exist</h1>", 404
-      if not is_subdir(self.fpath, dirpath):
-        return "<h1>Path out of bounds</h1>", 403
-      if not os.access(dirpath, os.R_OK):
-        return "<h1>Permission denied</h1>",  403
-      if isfile(dirpath):
-        resp = fl.make_response(send_file_partial(dirpath))
-        resp.headers.add("Accept-Ranges", "bytes")
-        return resp
-
-      asc = fl.request.args.get("a", "1") == "1"
-      _key = fl.request.args.get("c", "type").lower()
-      if _key == "lastmod":
-        key = SRT.LASTMOD
-      elif _key == "size":
-        key = SRT.SIZE
-      elif _key == "type":
-        key = SRT.TYPE
-      else:
-        key = SRT.NAME
+    if self.profiler is not None:
+      debugfn = partial(self._debugfn)
+      debugfn.__name__ = f"_debugfn{self.uid}"
+      self.app.add_url_rule(fr"/{self.uid}/debug", None, debugfn)
+      self.app.teardown_request(self.profiler.teardown)
 
-      relurlpath = relpath(dirpath, self.fpath)
-      urlpath = os.path.join(self.vpath, relurlpath)
-
-      proxy = ViewProxy(dirpath, urlpath, self.fpath, f"/{self.uid}/icons/",
-                        key, asc)
-      proxy.sort(key, asc)
-      return self.frontend.render_template(proxy, frontend=self.frontend)
+    def viewfn(filename):
+      # an event stream is slow by design, it'd crowd out every other request
+      if self.profiler is not None and fl.request.args.get("watch") != "1":
+        return self.profiler.trace(self._view, filename)
+      return self._view(filename)
 
     view_rule = os.path.join(self.vpath, "<path:filename>")
     self._viewfn = viewfn
@@ -467,6 +2015,142 @@ class DirView:
       # a partial function would be nicer
       # but this works. don't touch it.
 
+  def _view(self, filename:str):
+    if self.rootfd is None:
+      return self._serve_backend(filename)
+    try:
+      with phase("resolve"):
+        resolved = self.backend.resolve(filename)
+    except ResolveError as err:
+      return f"<h1>{err}</h1>", err.status
+
+    # the descriptor has to outlive a streamed body, so it's closed last
+    try:
+      resp = fl.make_response(self._serve(filename, resolved))
+    except BaseException:
+      resolved.close()
+      raise
+    resp.call_on_close(resolved.close)
+    return resp
+
+  def _serve(self, filename:str, resolved:Resolved):
+    dirpath = resolved.path
+    if not resolved.isdir:
+      return send_file_partial(dirpath, self.max_age, self.readahead,
+                               resolved.fd)
+
+    if fl.request.args.get("watch") == "1":
+      if not self.watch_interval:
+        return "<h1>Watching is disabled</h1>", 404
+      return self._watchfn(dirpath)
+
+    return self._listing(filename, dirpath, fd=resolved.fd)
+
+  def _serve_backend(self, filename:str):
+    # normalizing an absolute path can't climb above the root
+    path = posixpath.normpath("/" + filename).lstrip("/") or "."
+    # a directory listed lately is served from the cache without a round trip
+    if not self.service.has(path, self.backend):
+      try:
+        with phase("resolve"):
+          entry = self.backend.stat(path)
+      except FileNotFoundError:
+        return "<h1>Path doesn't exist</h1>", 404
+      except PermissionError:
+        return "<h1>Permission denied</h1>", 403
+
+      if not entry.isdir:
+        return send_backend_file(self.backend, path, entry, self.max_age,
+                                 self.readahead)
+    if fl.request.args.get("watch") == "1":
+      return "<h1>Watching is disabled</h1>", 404
+    return self._listing(filename, path, backend=self.backend)
+
+  def _listing(self, filename:str, path:str, fd:int=None,
+                     backend:Backend=None):
+    asc = fl.request.args.get("a", "1") == "1"
+    _key = fl.request.args.get("c", "type").lower()
+    if _key == "lastmod":
+      key = SRT.LASTMOD
+    elif _key == "size":
+      key = SRT.SIZE
+    elif _key == "type":
+      key = SRT.TYPE
+    else:
+      key = SRT.NAME
+
+    urlpath = posixpath.normpath(posixpath.join(self.vpath, filename))
+
+    proxy = ViewProxy(path, urlpath, self.root, f"/{self.uid}/icons/",
+                      key, asc, self.service, fd, backend)
+    proxy.sort(key, asc)
+    thumbpath = f"/{self.uid}/thumbs/" if self.thumbnails else None
+    if proxy.listing is not None: # too big to be rendered in memory
+      tally("entries", len(proxy.listing))
+      page = self.frontend.stream_template(proxy, frontend=self.frontend,
+                                           thumbpath=thumbpath)
+      return fl.Response(fl.stream_with_context(timed("render", page)),
+                         mimetype="text/html")
+    tally("entries", len(proxy.items))
+    with phase("render"):
+      return self.frontend.render_template(proxy, frontend=self.frontend,
+                                           thumbpath=thumbpath)
+
+  def _thumbfn(self, filename:str):
+    try:
+      resolved = self.backend.resolve(filename)
+    except ResolveError as err:
+      return "", err.status
+
+    try:
+      if resolved.isdir or \
+      not file_meta(resolved.path, resolved.fd).mime.startswith("image/"):
+        return "", 404
+      thumb = self.thumbnails.get(resolved.fd, resolved.stat)
+    except Exception: # not an image Pillow can read, or it took too long
+      return "", 404
+    finally:
+      resolved.close()
+
+    # the url carries a version, so the thumbnail itself never changes
+    resp = fl.send_file(thumb, mimetype="image/jpeg", conditional=True)
+    resp.headers.set("Cache-Control", "public, max-age=31536000, immutable")
+    return resp
+
+  def _debugfn(self):
+    token = fl.request.args.get("token") or \
+            fl.request.headers.get(Profiler.header)
+    if not self.profiler.authorized(token):
+      return "<h1>Permission denied</h1>", 403
+    resp = fl.jsonify(self.profiler.report())
+    resp.headers.set("Cache-Control", "no-store")
+    return resp
+
+  def _watchfn(self, dirpath:PathLike) -> fl.Response:
+    iconpath = f"/{self.uid}/icons/"
+
+    def stream():
+      q = DirWatcher.subscribe(dirpath, self.watch_interval)
+      try:
+        yield "retry: 5000\n\n"
+        while True:
+          try:
+            delta = q.get(timeout=15)
+          except queue.Empty: # keeps proxies from closing an idle connection
+            yield ": ping\n\n"
+            continue
+          if delta is None: # the watcher died, the browser will reconnect
+            return
+          data = self.frontend.render_delta(delta, iconpath)
+          yield f"event: delta\ndata: {data}\n\n"
+      finally:
+        DirWatcher.unsubscribe(dirpath, q)
+
+    resp = fl.Response(stream(), mimetype="text/event-stream")
+    resp.headers.set("Cache-Control", "no-cache")
+    resp.headers.set("X-Accel-Buffering", "no")
+    return resp
+
 
 ##==============================================================================
 ##                          implementation classes                            ##
@@ -523,8 +2207,13 @@ class Apache(AbstractView):
       {% for item in proxy.items %}
         {% set href = os.path.join(proxy.urlpath, item.basename) %}
         {% set icon = os.path.join(proxy.iconpath, frontend.icon(item)) %}
-        <tr>
-          <td valign="top"><img src="{{ icon }}" title="{{ item.mime }}"></td>
+        {% if frontend.gallery and thumbpath and item.mime.startswith("image/") %}
+          {% set icon = os.path.join(thumbpath, relpath(item.path, proxy.basepath))
+                      ~ "?v=" ~ item.lastmod.timestamp() ~ "-" ~ item.size %}
+          {% set lazy = 'loading="lazy" style="max-height: 8rem;"' %}
+        {% endif %}
+        <tr data-name="{{ item.basename }}">
+          <td valign="top"><img src="{{ icon }}" {{ lazy }} title="{{ item.mime }}"></td>
           <td><a href="{{ href }}">{{ item.name }}</a></td>
           <td align="left">{{ item.lastmodfmt }}</td>
           <td align="right">{{ item.sizefmt }}</td>
@@ -537,10 +2226,53 @@ class Apache(AbstractView):
       {{ proxy._g.__version__ }} at
       {{ urlparse(proxy._g.fl.globals.request.host_url).netloc }}
     </adress>
+    {% if frontend.live %}
+    <script>
+      // apply the deltas pushed by `?watch=1` instead of reloading the page
+      (function() {
+        var urlpath = {{ proxy.urlpath|tojson }};
+        var rows = document.querySelector("table > tbody");
+        var events = new EventSource("?watch=1");
+        function find(name) {
+          return rows.querySelector("tr[data-name='" + CSS.escape(name) + "']");
+        }
+        function fill(tr, item) {
+          var img = document.createElement("img"), a = document.createElement("a");
+          img.src = item.icon; img.title = item.mime;
+          a.href = urlpath.replace(/\/$/, "") + "/" + item.basename;
+          a.textContent = item.name;
+          tr.innerHTML = "<td valign='top'></td><td></td><td align='left'></td>"
+                       + "<td align='right'></td>";
+          tr.cells[0].appendChild(img);
+          tr.cells[1].appendChild(a);
+          tr.cells[2].textContent = item.lastmodfmt;
+          tr.cells[3].textContent = item.sizefmt;
+        }
+        events.addEventListener("delta", function(ev) {
+          var delta = JSON.parse(ev.data);
+          delta.remove.forEach(function(name) {
+            var tr = find(name);
+            if (tr) tr.remove();
+          });
+          delta.modify.concat(delta.add).forEach(function(item) {
+            var tr = find(item.basename);
+            if (!tr) {
+              tr = document.createElement("tr");
+              tr.dataset.name = item.basename;
+              rows.insertBefore(tr, rows.lastElementChild);
+            }
+            fill(tr, item);
+          });
+        });
+      })();
+    </script>
+    {% endif %}
   </body>
   </html>
   """))
 
+  live = False # apply `?watch=1` deltas client-side
+  gallery = False # show thumbnails of images, needs `DirView(thumbnails=...)`
   iconmap = {}
   mimemap = {
     "inode/x-empty": "generic.gif",
@@ -855,6 +2587,42 @@ class Apache(AbstractView):
     return "generic.gif"
 
 
+unsafe_url = re.compile(r"[^\w.~/-]", re.ASCII).search
+unsafe_html = re.compile(r"[&<>\"']").search
+
+class Nginx(StringView):
+  """the output of nginx's `autoindex on;`"""
+  namelen = 50
+
+  def header(self, viewproxy:ViewProxy) -> str:
+    index = escape(posixpath.normpath(viewproxy.urlpath).rstrip("/") + "/")
+    parent = ""
+    if viewproxy.path != viewproxy.basepath:
+      href = quote(posixpath.dirname(posixpath.normpath(viewproxy.urlpath)))
+      parent = f'<a href="{href.rstrip("/")}/">../</a>\r\n'
+    return (f"<html>\r\n<head><title>Index of {index}</title></head>\r\n"
+            f"<body>\r\n<h1>Index of {index}</h1><hr><pre>{parent}")
+
+  def rows(self, viewproxy:ViewProxy) -> t.Iterator[str]:
+    namelen = self.namelen
+    prefix = quote(viewproxy.urlpath.rstrip("/") + "/")
+    dates = {} # strftime is the slowest part of a row, most of them repeat
+    for item in viewproxy.items:
+      name = item.name
+      href = prefix + (quote(name) if unsafe_url(name) else name)
+      if len(name) > namelen:
+        name = name[:namelen - 3] + "..>"
+      date = dates.get(item.lastmodfmt)
+      if date is None:
+        date = dates[item.lastmodfmt] = item.lastmod.strftime("%d-%b-%Y %H:%M")
+      size = "-" if item.isdir else item.size
+      yield (f'<a href="{href}">{escape(name) if unsafe_html(name) else name}'
+             f'</a>{" " * (namelen - len(name))} {date} {size:>19}\r\n')
+
+  def footer(self, viewproxy:ViewProxy) -> str:
+    return "</pre><hr></body>\r\n</html>\r\n"
+
+
 if __name__ == "__main__":
   import webbrowser
   app = fl.Flask("DirViewer")
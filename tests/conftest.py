@@ -0,0 +1,5 @@
+import os
+import sys
+
+# flask_dirview is a single module, meant to be copied rather than installed
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
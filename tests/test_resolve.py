@@ -0,0 +1,125 @@
+"""`resolve`, the walk that keeps every lookup under the root"""
+
+import os
+import threading
+
+import pytest
+
+import flask_dirview
+from flask_dirview import ResolveError, resolve, scan_directory
+
+
+@pytest.fixture
+def root(tmp_path):
+  base = tmp_path / "root"
+  (base / "sub").mkdir(parents=True)
+  (base / "sub" / "file.txt").write_text("inside")
+  (tmp_path / "root2").mkdir() # shares the prefix of the root
+  (tmp_path / "root2" / "file.txt").write_text("sibling")
+  (tmp_path / "secret.txt").write_text("outside" * 100)
+  return base
+
+
+@pytest.fixture
+def walk(root):
+  rootfd = os.open(root, os.O_RDONLY | os.O_DIRECTORY)
+  opened = []
+  def walk(path):
+    resolved = resolve(str(root), rootfd, path)
+    opened.append(resolved)
+    return resolved
+  yield walk
+  for resolved in opened:
+    resolved.close()
+  os.close(rootfd)
+
+
+def status(walk, path):
+  with pytest.raises(ResolveError) as err:
+    walk(path)
+  return err.value.status
+
+
+@pytest.fixture(params=["O_PATH", "O_RDONLY"])
+def fallback(request, monkeypatch):
+  # every case also runs the way it would without `O_PATH`
+  if request.param == "O_RDONLY":
+    monkeypatch.setattr(flask_dirview, "O_PATH", os.O_RDONLY)
+
+
+def test_inside(root, walk, fallback):
+  (root / "link").symlink_to("sub/file.txt")
+  (root / "abs").symlink_to(root / "sub")
+  assert walk("sub/file.txt").path == str(root / "sub" / "file.txt")
+  assert walk("sub/../sub/./file.txt").stat.st_size == 6
+  assert walk("link").path == str(root / "sub" / "file.txt")
+  assert walk("abs/file.txt").path == str(root / "sub" / "file.txt")
+  assert walk("/").isdir and walk("").path == str(root)
+
+
+def test_dotdot_above_root(walk, fallback):
+  assert status(walk, "..") == 403
+  assert status(walk, "sub/../../secret.txt") == 403
+  assert status(walk, "sub/../..") == 403
+
+
+def test_relative_symlink_out(root, walk, fallback):
+  (root / "out").symlink_to("../secret.txt")
+  (root / "sub" / "deep").symlink_to("../../root2")
+  assert status(walk, "out") == 403
+  assert status(walk, "sub/deep/file.txt") == 403
+
+
+def test_absolute_symlink_out(root, walk, fallback):
+  (root / "out").symlink_to(root.parent / "secret.txt")
+  (root / "sibling").symlink_to(root.parent / "root2" / "file.txt")
+  assert status(walk, "out") == 403
+  assert status(walk, "sibling") == 403
+
+
+def test_symlink_loop(root, walk, fallback):
+  (root / "a").symlink_to("b")
+  (root / "b").symlink_to("a")
+  (root / "self").symlink_to("self/x")
+  assert status(walk, "a") == 404
+  assert status(walk, "self") == 404
+
+
+def test_missing(walk, fallback):
+  assert status(walk, "nope") == 404
+  assert status(walk, "sub/file.txt/x") == 404
+
+
+def test_fifo(root, walk, fallback):
+  os.mkfifo(root / "fifo")
+  errors = []
+  def lookup(): # a blocking `open` would hang here for good
+    errors.append(status(walk, "fifo"))
+  thread = threading.Thread(target=lookup, daemon=True)
+  thread.start()
+  thread.join(5)
+  assert errors == [404]
+
+
+@pytest.mark.skipif(os.geteuid() == 0, reason="root reads everything")
+def test_unreadable(root, walk, fallback):
+  locked = root / "locked"
+  locked.mkdir()
+  (locked / "file.txt").write_text("x")
+  (root / "private.txt").write_text("x")
+  (root / "private.txt").chmod(0)
+  locked.chmod(0)
+  try:
+    assert status(walk, "locked") == 403
+    assert status(walk, "locked/file.txt") == 403
+    assert status(walk, "private.txt") == 403
+  finally:
+    locked.chmod(0o700)
+
+
+def test_listing_doesnt_follow_out(root):
+  (root / "out").symlink_to(root.parent / "secret.txt")
+  (root / "dangling").symlink_to("nowhere")
+  sizes = {x.name: x.size for x in scan_directory(root / "sub" / "..")}
+  assert sizes["out"] == os.lstat(root / "out").st_size
+  assert sizes["dangling"] == os.lstat(root / "dangling").st_size
@@ -0,0 +1,101 @@
+"""spilling of listings over budget, their external sort and accounting"""
+
+import os
+
+import pytest
+
+import flask_dirview
+from flask_dirview import (ITEM_COST, SRT, ListingService, MemoryBudget,
+                           SpilledListing, ViewProxy, scan_directory)
+
+
+COUNT = 3000
+
+@pytest.fixture(scope="module")
+def directory(tmp_path_factory):
+  root = tmp_path_factory.mktemp("spill")
+  for i in range(COUNT):
+    ext = ("txt", "py", "bin")[i % 3]
+    path = root / f"f{i * 7919 % COUNT:05}.{ext}"
+    path.write_text("#!/bin/sh\n" * (i % 5) if i % 4 else "x" * (i % 11))
+    os.utime(path, (1e9 + i % 17, 1e9 + i % 17)) # plenty of ties
+  (root / "sub").mkdir()
+  return str(root)
+
+
+@pytest.fixture
+def tiny_runs(monkeypatch):
+  # lots of runs, so the merge takes more than one pass
+  monkeypatch.setattr(flask_dirview, "MIN_RUN", 8)
+
+
+@pytest.fixture(scope="module")
+def listing(directory):
+  return scan_directory(directory)
+
+
+def in_memory(listing, key, asc):
+  # the same sort `ViewProxy.sort` does on a presorted in-memory listing
+  attr = ["lastmod", "name", "size", "mime"][key]
+  return [x.name for x in sorted(listing, key=lambda x: getattr(x, attr),
+                                 reverse=not asc)]
+
+
+@pytest.fixture(scope="module")
+def starved(directory):
+  # scanned with nothing left in the budget, so it's spilled in tiny runs
+  budget = MemoryBudget(0)
+  with pytest.MonkeyPatch.context() as patch:
+    patch.setattr(flask_dirview, "MIN_RUN", 8)
+    return scan_directory(directory, budget=budget), budget
+
+
+@pytest.mark.parametrize("key", list(SRT))
+@pytest.mark.parametrize("asc", [True, False])
+def test_orders_match_in_memory(listing, starved, tiny_runs, key, asc):
+  spilled, budget = starved
+  assert isinstance(spilled, SpilledListing)
+  assert len(spilled) == COUNT + 1
+  assert len(spilled._chunks) > SpilledListing.fanin
+  assert [x.name for x in spilled.sorted(key, asc)] == \
+         in_memory(listing, key, asc)
+  assert len(spilled._runs[(key, asc)]) <= SpilledListing.fanin
+  assert budget.used == 0
+
+
+def test_chunks_fit_the_request_budget(directory):
+  budget = MemoryBudget(1 << 30)
+  spilled = scan_directory(directory, 1500 * ITEM_COST, budget)
+  assert isinstance(spilled, SpilledListing)
+  assert max(size for _, size in spilled._chunks) == 1500
+  assert sum(size for _, size in spilled._chunks) == COUNT + 1
+  assert budget.used == 0
+
+
+def test_merge_is_charged(directory, tiny_runs):
+  budget = MemoryBudget(1 << 30)
+  spilled = scan_directory(directory, 100 * ITEM_COST, budget)
+  rows = spilled.sorted(SRT.SIZE, False)
+  next(rows)
+  assert budget.used > 0 # the read buffers of the merge
+  list(rows)
+  assert budget.used == 0
+
+
+def test_service_budget(directory, listing):
+  service = ListingService(request_budget=500 * ITEM_COST,
+                           process_budget=2000 * ITEM_COST)
+  subdir = os.path.join(directory, "sub")
+  small = service.get(subdir)
+  assert isinstance(small, list)
+  big = service.get(directory)
+  assert isinstance(big, SpilledListing)
+
+  proxy = ViewProxy(directory, "/", directory, key=SRT.NAME, asc=False,
+                    service=service)
+  proxy.sort(SRT.NAME, False)
+  assert [x.name for x in proxy.items] == in_memory(listing, SRT.NAME, False)
+  assert service.budget.used == len(small) * ITEM_COST
+
+  service.clear()
+  assert service.budget.used == 0